@@ -0,0 +1,21 @@
+"""Convert sample_patients.csv to sample_patients.parquet.
+
+Parquet stores the categorical/int8 schema directly, so load_data can
+skip CSV parsing on cold start. Re-run after editing the CSV:
+
+    python scripts/build_parquet.py
+"""
+
+import pandas as pd
+
+df = pd.read_csv(
+    "sample_patients.csv",
+    dtype={
+        "stage": "category",
+        "mutation_status": "category",
+        "gender": "category",
+        "performance_status": "int8",
+    },
+)
+df.to_parquet("sample_patients.parquet", index=False)
+print(f"Wrote sample_patients.parquet ({len(df)} rows)")
@@ -1,10 +1,26 @@
+import time
+from collections import deque
+
 import streamlit as st
 import pandas as pd
-import json
-import pdfplumber
-import os
-import openai
-import matplotlib.pyplot as plt
+
+from trialmatch import (
+    append_log,
+    compute_match_matrix,
+    compute_matches,
+    explain_match,
+    extract_pdf_text,
+    fetch_batch,
+    interpret_many,
+    load_comments,
+    load_data,
+    load_log,
+    load_trials,
+    matched_patients_csv,
+    mutation_distribution,
+    save_comment,
+    submit_batch,
+)
 
 # Branding
 st.set_page_config(page_title="TrialMatch AI", page_icon="🧬", layout="wide")
@@ -12,113 +28,6 @@ st.set_page_config(page_title="TrialMatch AI", page_icon="🧬", layout="wide")
 st.title("Welcome to TrialMatch AI")
 st.write("Your AI-powered clinical trial matching platform for NSCLC patients.")
 
-# -----------------------------
-# Data Loading Functions
-# -----------------------------
-@st.cache_data
-def load_data():
-    return pd.read_csv("sample_patients.csv")
-
-@st.cache_data
-def load_trials():
-    trials = {}
-    for trial_file in ["egfr.json", "pd-l1.json", "kras_g12c.json", "combo.json", "early_stage.json"]:
-        try:
-            with open(trial_file) as f:
-                trials[trial_file] = json.load(f)
-        except FileNotFoundError:
-            st.error(f"Trial file {trial_file} not found.")
-    return trials
-
-# -----------------------------
-# Matching Logic with Explanation
-# -----------------------------
-def match_patient_to_trial(patient, trial_criteria):
-    reasons = []
-
-    # Stage check
-    if "stage" in trial_criteria and patient["stage"] not in trial_criteria["stage"]:
-        reasons.append(f"Patient stage {patient['stage']} not in allowed stages {trial_criteria['stage']}")
-        return False, reasons
-
-    # Mutation check
-    mutation_required = trial_criteria.get("mutation_required", None)
-    if mutation_required:
-        if isinstance(mutation_required, list):
-            if patient["mutation_status"] not in mutation_required:
-                reasons.append(f"Mutation {patient['mutation_status']} not in required list {mutation_required}")
-                return False, reasons
-        else:
-            if patient["mutation_status"] != mutation_required:
-                reasons.append(f"Mutation {patient['mutation_status']} does not match required {mutation_required}")
-                return False, reasons
-
-    # Performance status check
-    if patient["performance_status"] > trial_criteria.get("performance_status_max", 2):
-        reasons.append(f"Performance status {patient['performance_status']} exceeds max {trial_criteria.get('performance_status_max', 2)}")
-        return False, reasons
-
-    reasons.append("Meets all inclusion criteria")
-    return True, reasons
-
-# -----------------------------
-# PDF Parsing Function
-# -----------------------------
-def extract_criteria_from_pdf(pdf_path):
-    inclusion = []
-    exclusion = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if not text:
-                continue
-            lines = text.split("\n")
-            for line in lines:
-                low = line.lower()
-                if "inclusion" in low:
-                    inclusion.append(line.strip())
-                elif "exclusion" in low:
-                    exclusion.append(line.strip())
-    return inclusion, exclusion
-
-# -----------------------------
-# AI-Powered PDF Interpretation
-# -----------------------------
-openai.api_key = st.secrets["OPENAI_API_KEY"]
-
-def interpret_trial_criteria_llm(text):
-    prompt = f"""
-    You are a clinical trial document parser. Extract the following from the trial text below:
-    - Stage requirements (as list of strings, e.g. ["I", "IIIA"])
-    - Required mutations (as list, e.g. ["EGFR", "PD-L1"])
-    - Maximum allowed ECOG performance status (integer)
-    - Raw inclusion criteria (list of strings)
-    - Raw exclusion criteria (list of strings)
-
-    Only return a valid JSON object with the following keys:
-    stage, mutation_required, performance_status_max, raw_inclusion, raw_exclusion.
-
-    Trial text:
-    {text}
-    """
-
-    response = openai.ChatCompletion.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "system", "content": "You are a helpful clinical trial parser."},
-                  {"role": "user", "content": prompt}],
-        temperature=0
-    )
-
-    parsed = response["choices"][0]["message"]["content"]
-
-    try:
-        structured = json.loads(parsed)
-    except json.JSONDecodeError:
-        st.error("Failed to parse JSON from AI output.")
-        structured = {}
-
-    return structured
-
 # -----------------------------
 # Load Data
 # -----------------------------
@@ -132,40 +41,88 @@ st.header("Top Stats")
 st.markdown(f"- Total Patients: **{len(patients)}**")
 st.markdown(f"- Total Trials: **{len(trials)}**")
 
-mutation_counts = patients['mutation_status'].value_counts()
-st.bar_chart(mutation_counts)
+st.bar_chart(mutation_distribution())
 
 # -----------------------------
 # Local Storage for Comments/Status/Notes
 # -----------------------------
+STATUS_OPTIONS = ["Not Reviewed", "Reviewed", "Rejected", "Accepted"]
+STATUS_DTYPE = pd.CategoricalDtype(STATUS_OPTIONS)
+
 if 'comments' not in st.session_state:
-    st.session_state['comments'] = {}  # key: (patient_id, trial_title), value: dict with comment & status
+    # Indexed by (patient_id, trial_title); contiguous storage renders as
+    # one table in the collaboration tab and slices vectorized. Status is
+    # a fixed categorical, so filters compare integer codes. Session
+    # state is a write-through cache over the disk store, so rows survive
+    # server restarts.
+    persisted = load_comments()
+    comment_index = pd.MultiIndex.from_tuples(
+        list(persisted.keys()), names=["patient_id", "trial_title"]
+    )
+    st.session_state['comments'] = pd.DataFrame(
+        {
+            "comment": pd.Series(
+                [r["comment"] for r in persisted.values()],
+                index=comment_index, dtype=object,
+            ),
+            "status": pd.Series(
+                [r["status"] for r in persisted.values()],
+                index=comment_index, dtype=STATUS_DTYPE,
+            ),
+        },
+        index=comment_index,
+    )
 
 if 'compliance_log' not in st.session_state:
-    st.session_state['compliance_log'] = []
+    # Bounded so a long session can't grow the log without limit;
+    # timestamps are stored as raw ns and formatted only on display.
+    # Seeded from the disk store so the audit trail survives restarts.
+    st.session_state['compliance_log'] = deque(load_log(), maxlen=1000)
 
 # -----------------------------
 # Tabs
 # -----------------------------
+def _save_comment(key, comment_key, status_key):
+    # on_change callback: one row write per actual user edit instead of
+    # one per expander per rerun. Also written through to the disk store.
+    comment = st.session_state[comment_key]
+    status = st.session_state[status_key]
+    st.session_state['comments'].loc[key, :] = [comment, status]
+    save_comment(key, comment, status)
+
+def _get_comment(key):
+    comments = st.session_state['comments']
+    return comments.loc[key].to_dict() if key in comments.index else {}
+
+@st.cache_data
+def make_csv(records):
+    """Encode export rows once per distinct content; reruns with the same
+    selection and comments reuse the cached bytes."""
+    return pd.DataFrame(records).to_csv(index=False).encode()
+
 tab1, tab2, tab3, tab4 = st.tabs([
-    "📋 Patient-Centric View", 
-    "🧪 Trial-Centric View", 
-    "📄 Upload Trial PDF", 
+    "📋 Patient-Centric View",
+    "🧪 Trial-Centric View",
+    "📄 Upload Trial PDF",
     "🗂️ Collaboration & Logs"
 ])
 
 # --- Patient-Centric View ---
 with tab1:
-    selected_patient = st.selectbox("Select a Patient ID", patients["patient_id"])
-    patient_row = patients[patients["patient_id"] == selected_patient].iloc[0]
+    selected_patient = st.selectbox("Select a Patient ID", patients.index)
+    patient_row = patients.loc[selected_patient]
     st.subheader("Patient Info")
     st.write(patient_row)
 
     st.subheader("Matching Trials")
 
     matched_trials = []
+    # Booleans come from the cheap cached matrix; reasons are resolved per
+    # trial through the profile-memoized explainer for this patient only.
+    match_row = compute_match_matrix().loc[selected_patient]
     for trial_file, trial in trials.items():
-        is_match, reasons = match_patient_to_trial(patient_row, trial["criteria"])
+        is_match = bool(match_row[trial_file])
+        reasons = explain_match(trial_file, patient_row)
         matched_trials.append({
             "trial_title": trial["title"],
             "is_match": is_match,
@@ -180,25 +137,38 @@ with tab1:
             comment_key = f"comment_{selected_patient}_{trial['title']}"
             status_key = f"status_{selected_patient}_{trial['title']}"
 
-            comment = st.text_area("Add comment or notes:", key=comment_key, value=st.session_state['comments'].get(key, {}).get("comment", ""))
-            status = st.selectbox("Set status:", ["Not Reviewed", "Reviewed", "Rejected", "Accepted"], key=status_key, index=["Not Reviewed", "Reviewed", "Rejected", "Accepted"].index(st.session_state['comments'].get(key, {}).get("status", "Not Reviewed")))
-
-            # Save to session_state on change
-            st.session_state['comments'][key] = {"comment": comment, "status": status}
+            # Widgets are only constructed for trials the reviewer opens
+            # for editing; the initial paint stays a flat list of reasons.
+            if st.toggle("Edit notes", key=f"open_{selected_patient}_{trial['title']}"):
+                saved = _get_comment(key)
+                # Form defers the rerun until Save, so typing a comment
+                # does not re-execute the whole app per keystroke.
+                with st.form(key=f"form_{selected_patient}_{trial['title']}"):
+                    st.text_area(
+                        "Add comment or notes:", key=comment_key,
+                        value=saved.get("comment", ""),
+                    )
+                    st.selectbox(
+                        "Set status:", STATUS_OPTIONS, key=status_key,
+                        index=STATUS_OPTIONS.index(saved.get("status", "Not Reviewed")),
+                    )
+                    st.form_submit_button(
+                        "Save", on_click=_save_comment, args=(key, comment_key, status_key),
+                    )
 
     # Export matched patients for the selected patient (just one row)
-    export_df = pd.DataFrame([{
+    export_records = [{
         "patient_id": selected_patient,
         "trial_title": m["trial_title"],
         "match": m["is_match"],
         "reasons": "; ".join(m["reasons"]),
-        "comment": st.session_state['comments'].get((selected_patient, m["trial_title"]), {}).get("comment", ""),
-        "status": st.session_state['comments'].get((selected_patient, m["trial_title"]), {}).get("status", "")
-    } for m in matched_trials])
+        "comment": _get_comment((selected_patient, m["trial_title"])).get("comment", ""),
+        "status": _get_comment((selected_patient, m["trial_title"])).get("status", "")
+    } for m in matched_trials]
 
     st.download_button(
         label="Export Patient Matches (CSV)",
-        data=export_df.to_csv(index=False),
+        data=make_csv(export_records),
         file_name=f"patient_{selected_patient}_matches.csv",
         mime="text/csv"
     )
@@ -212,20 +182,22 @@ with tab2:
 
     st.subheader("Matching Patients")
 
-    matched_patients = []
-    for _, patient in patients.iterrows():
-        is_match, reasons = match_patient_to_trial(patient, trial["criteria"])
-        if is_match:
-            matched_patients.append(patient["patient_id"])
-            with st.expander(f"✅ Patient {patient['patient_id']}"):
-                for r in reasons:
-                    st.write("- " + r)
+    matches_df = compute_matches(selected_trial_file)
+    # One Arrow-serialized table instead of one expander widget per patient.
+    st.dataframe(
+        matches_df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "is_match": st.column_config.CheckboxColumn("Match"),
+            "reasons": st.column_config.ListColumn("Reasons"),
+        },
+    )
 
     # Export matched patients for selected trial
-    export_trial_df = patients[patients["patient_id"].isin(matched_patients)]
     st.download_button(
         label="Export Matched Patients for Trial (CSV)",
-        data=export_trial_df.to_csv(index=False),
+        data=matched_patients_csv(selected_trial_file),
         file_name=f"trial_{trial['title'].replace(' ', '_')}_matched_patients.csv",
         mime="text/csv"
     )
@@ -233,16 +205,11 @@ with tab2:
 # --- PDF Upload View (AI-powered) ---
 with tab3:
     st.subheader("Upload Trial PDF to Extract & Interpret Criteria (AI-powered)")
-    uploaded_file = st.file_uploader("Upload a trial PDF", type=["pdf"])
-    if uploaded_file:
-        temp_path = "temp_trial.pdf"
-        with open(temp_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+    uploaded_files = st.file_uploader("Upload trial PDFs", type=["pdf"], accept_multiple_files=True)
 
-        with pdfplumber.open(temp_path) as pdf:
-            all_text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-
-        trial_criteria = interpret_trial_criteria_llm(all_text)
+    def render_criteria(trial_criteria, heading=None):
+        if heading:
+            st.markdown(f"## {heading}")
 
         st.markdown("### Structured Criteria Extracted (AI)")
         st.json(trial_criteria)
@@ -253,32 +220,65 @@ with tab3:
         st.markdown("### Raw Exclusion Criteria")
         st.write(trial_criteria.get("raw_exclusion", []))
 
+    if uploaded_files:
+        # Parse straight from the upload buffers; extraction is cached on
+        # the file bytes so reruns don't re-parse held uploads.
+        texts = [extract_pdf_text(f.getvalue()) for f in uploaded_files]
+
+        use_batch = len(uploaded_files) > 1 and st.checkbox(
+            "Bulk ingest via OpenAI Batch API (half cost, results within 24h)"
+        )
+        if use_batch:
+            if st.button("Submit batch"):
+                st.session_state['batch_id'] = submit_batch(
+                    {f.name: text for f, text in zip(uploaded_files, texts)}
+                )
+            batch_id = st.session_state.get('batch_id')
+            if batch_id:
+                st.write(f"Submitted batch: `{batch_id}`")
+                if st.button("Check batch status"):
+                    status, results = fetch_batch(batch_id)
+                    if status == "completed":
+                        for name, trial_criteria in results.items():
+                            render_criteria(trial_criteria, heading=name)
+                    else:
+                        st.info(f"Batch status: {status}")
+        else:
+            # Interactive path: LLM calls for a batch of uploads run concurrently.
+            results = interpret_many(texts)
+            for uploaded_file, trial_criteria in zip(uploaded_files, results):
+                render_criteria(
+                    trial_criteria,
+                    heading=uploaded_file.name if len(uploaded_files) > 1 else None,
+                )
+
 # --- Collaboration & Logs Tab ---
 with tab4:
     st.subheader("Collaboration & Notes")
 
-    # Display existing comments and statuses
-    if st.session_state['comments']:
+    # Display existing comments and statuses as one table render
+    if len(st.session_state['comments']):
         st.write("### Comments & Status per Patient-Trial Match")
-        for (patient_id, trial_title), data in st.session_state['comments'].items():
-            st.markdown(f"**Patient {patient_id} — Trial: {trial_title}**")
-            st.write(f"- Status: {data.get('status', '')}")
-            st.write(f"- Comment: {data.get('comment', '')}")
-            st.write("---")
+        st.dataframe(st.session_state['comments'], use_container_width=True)
     else:
         st.write("No comments or statuses added yet.")
 
     st.subheader("Compliance & Audit Logs")
     st.write("This section will track actions for compliance and audit purposes.")
     if st.button("Add sample compliance log entry"):
-        st.session_state['compliance_log'].append({
+        entry = {
             "action": "Sample log entry",
-            "timestamp": pd.Timestamp.now().isoformat()
-        })
+            "ts_ns": time.time_ns()
+        }
+        st.session_state['compliance_log'].append(entry)
+        append_log(entry)
 
     if st.session_state['compliance_log']:
-        for entry in st.session_state['compliance_log']:
-            st.write(f"{entry['timestamp']}: {entry['action']}")
+        # Format every stored timestamp in one vectorized pass and render
+        # the log as a single table instead of one st.write per entry.
+        log_df = pd.DataFrame(st.session_state['compliance_log'])
+        log_df["timestamp"] = pd.to_datetime(log_df.pop("ts_ns"), unit="ns").dt.strftime("%Y-%m-%d %H:%M:%S")
+        st.dataframe(log_df[["timestamp", "action"]], use_container_width=True, hide_index=True)
     else:
         st.write("No compliance logs recorded yet.")
 
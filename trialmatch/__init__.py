@@ -0,0 +1,32 @@
+"""Shared data-loading, matching, PDF and LLM helpers for TrialMatch AI.
+
+The Streamlit entrypoint (streamlit_app.py) is a thin view layer over
+these modules.
+"""
+
+from trialmatch.data import (
+    compile_criteria,
+    compile_trials,
+    load_data,
+    load_trials,
+    mutation_distribution,
+)
+from trialmatch.match import (
+    REASON_TEMPLATES,
+    REASON_OK,
+    compute_match_mask,
+    compute_match_matrix,
+    compute_matches,
+    explain_match,
+    format_reasons,
+    match_patient_to_trial,
+    matched_patients_csv,
+)
+from trialmatch.pdf import extract_criteria_from_pdf, extract_pdf_text, iter_page_texts
+from trialmatch.llm import (
+    fetch_batch,
+    interpret_many,
+    interpret_trial_criteria_llm,
+    submit_batch,
+)
+from trialmatch.store import append_log, load_comments, load_log, save_comment
@@ -0,0 +1,83 @@
+"""Cached loaders for the patient cohort and trial criteria files."""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional fast path
+    orjson = None
+
+
+@st.cache_resource
+def load_data():
+    # cache_resource skips the per-access output hashing/copying that
+    # cache_data does on DataFrames; callers share one frame and must
+    # treat it as read-only.
+    # Low-cardinality string columns become categoricals (integer-code
+    # comparisons, ~8x smaller) and performance_status fits in an int8.
+    # The Parquet copy (built by scripts/build_parquet.py) already stores
+    # that schema and skips CSV parsing entirely on cold start.
+    if os.path.exists("sample_patients.parquet"):
+        df = pd.read_parquet("sample_patients.parquet")
+    else:
+        df = pd.read_csv(
+            "sample_patients.csv",
+            engine="pyarrow",
+            dtype={
+                "stage": "category",
+                "mutation_status": "category",
+                "gender": "category",
+                "performance_status": "int8",
+            },
+        )
+    # Indexed by patient_id (kept as a column too) so the patient view
+    # does an O(1) .loc lookup instead of a boolean scan per rerun.
+    return df.set_index("patient_id", drop=False)
+
+def _read_trial(path):
+    if not path.exists():
+        return path.name, None
+    raw = path.read_bytes()
+    return path.name, orjson.loads(raw) if orjson else json.loads(raw)
+
+@st.cache_data
+def load_trials():
+    # Trial files are discovered by glob, so adding a trial means dropping
+    # a JSON next to the app — no code edit. File reads are I/O-bound; a
+    # small pool overlaps them. Errors are reported from the main thread
+    # where st.error is safe.
+    trial_paths = sorted(Path(".").glob("*.json"))
+    trials = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(trial_paths))) as ex:
+        for trial_file, parsed in ex.map(_read_trial, trial_paths):
+            if parsed is None:
+                st.error(f"Trial file {trial_file} not found.")
+            else:
+                trials[trial_file] = parsed
+    return trials
+
+def compile_criteria(criteria):
+    """Normalize a trial's criteria dict once: frozensets for membership
+    tests, a plain int for the performance cap."""
+    mutation_required = criteria.get("mutation_required", None)
+    if mutation_required and not isinstance(mutation_required, list):
+        mutation_required = [mutation_required]
+    return {
+        "stage": frozenset(criteria["stage"]) if "stage" in criteria else None,
+        "mutations": frozenset(mutation_required) if mutation_required else None,
+        "perf_max": int(criteria.get("performance_status_max", 2)),
+    }
+
+@st.cache_data
+def compile_trials(trials):
+    return {tf: compile_criteria(t["criteria"]) for tf, t in trials.items()}
+
+@st.cache_data
+def mutation_distribution():
+    return load_data()["mutation_status"].value_counts()
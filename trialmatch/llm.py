@@ -0,0 +1,126 @@
+"""AI-powered interpretation of trial criteria text."""
+
+import hashlib
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI
+import streamlit as st
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional fast path
+    orjson = None
+
+# Criteria sections start at the first "inclusion" mention; everything
+# before (title pages, background) is noise for the parser.
+_CRITERIA_START_RE = re.compile(r"inclusion", re.IGNORECASE)
+_EXCERPT_MAX_CHARS = 12000
+
+@st.cache_resource
+def get_openai():
+    """One v1 client per process; reuses its HTTP connection pool across
+    calls instead of re-handshaking per request."""
+    return OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+
+def _criteria_excerpt(text):
+    match = _CRITERIA_START_RE.search(text)
+    excerpt = text[match.start():] if match else text
+    return excerpt[:_EXCERPT_MAX_CHARS]
+
+_MODEL = "gpt-4o-mini"
+
+def _build_messages(text):
+    prompt = f"""
+    You are a clinical trial document parser. Extract the following from the trial text below:
+    - Stage requirements (as list of strings, e.g. ["I", "IIIA"])
+    - Required mutations (as list, e.g. ["EGFR", "PD-L1"])
+    - Maximum allowed ECOG performance status (integer)
+    - Raw inclusion criteria (list of strings)
+    - Raw exclusion criteria (list of strings)
+
+    Only return a valid JSON object with the following keys:
+    stage, mutation_required, performance_status_max, raw_inclusion, raw_exclusion.
+
+    Trial text:
+    {_criteria_excerpt(text)}
+    """
+    return [{"role": "system", "content": "You are a helpful clinical trial parser."},
+            {"role": "user", "content": prompt}]
+
+def _parse_structured(parsed):
+    try:
+        # orjson.JSONDecodeError and json.JSONDecodeError both subclass ValueError.
+        return orjson.loads(parsed) if orjson else json.loads(parsed)
+    except ValueError:
+        st.error("Failed to parse JSON from AI output.")
+        return {}
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def interpret_trial_criteria_llm(text_hash, text):
+    """Ask the LLM to structure trial criteria. Cached on a SHA1 of the
+    extracted text so reruns for the same upload skip the API call."""
+    response = get_openai().chat.completions.create(
+        model=_MODEL,
+        messages=_build_messages(text),
+        response_format={"type": "json_object"},
+        temperature=0
+    )
+    return _parse_structured(response.choices[0].message.content)
+
+def submit_batch(texts_by_name):
+    """Submit one Batch API job for several trial texts (half the cost of
+    synchronous calls, results within 24h). Returns the batch id."""
+    client = get_openai()
+    lines = []
+    for name, text in texts_by_name.items():
+        request = {
+            "custom_id": name,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": _MODEL,
+                "messages": _build_messages(text),
+                "response_format": {"type": "json_object"},
+                "temperature": 0,
+            },
+        }
+        lines.append(orjson.dumps(request) if orjson else json.dumps(request).encode())
+    batch_file = client.files.create(
+        file=("trialmatch_batch.jsonl", b"\n".join(lines)),
+        purpose="batch",
+    )
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    return batch.id
+
+def fetch_batch(batch_id):
+    """Poll a submitted batch once. Returns (status, results) where results
+    maps custom_id -> structured criteria and is empty until completed."""
+    client = get_openai()
+    batch = client.batches.retrieve(batch_id)
+    if batch.status != "completed":
+        return batch.status, {}
+    results = {}
+    for line in client.files.content(batch.output_file_id).content.splitlines():
+        record = orjson.loads(line) if orjson else json.loads(line)
+        content = record["response"]["body"]["choices"][0]["message"]["content"]
+        results[record["custom_id"]] = _parse_structured(content)
+    return batch.status, results
+
+def interpret_many(texts):
+    """Interpret several extracted trial texts, overlapping the API
+    round-trips across a small thread pool. Each text still goes through
+    the hash-keyed cache, so repeats cost nothing."""
+    def one(text):
+        text_hash = hashlib.sha1(text.encode()).hexdigest()
+        return interpret_trial_criteria_llm(text_hash, text)
+
+    if len(texts) <= 1:
+        return [one(t) for t in texts]
+    with ThreadPoolExecutor(max_workers=min(8, len(texts))) as ex:
+        return list(ex.map(one, texts))
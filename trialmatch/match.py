@@ -0,0 +1,182 @@
+"""Patient-to-trial matching: vectorized masks, the cached match matrix
+and lazily formatted reason strings."""
+
+import functools
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+try:
+    import numba
+except ImportError:  # pragma: no cover - optional fast path
+    numba = None
+
+from trialmatch.data import compile_trials, load_data, load_trials
+
+# Reason codes returned by match_patient_to_trial; templates are only
+# rendered (via format_reasons) for rows actually displayed.
+REASON_STAGE, REASON_MUTATION, REASON_PERF, REASON_OK = range(4)
+REASON_TEMPLATES = [
+    "Patient stage {stage} not in allowed stages {stages}",
+    "Mutation {mutation} not in required list {mutations}",
+    "Performance status {perf} exceeds max {perf_max}",
+    "Meets all inclusion criteria",
+]
+
+def match_patient_to_trial(patient, compiled):
+    """Per-row matcher against a compiled criteria struct; returns
+    (is_match, reason_codes) where codes index REASON_TEMPLATES."""
+    # Stage check
+    if compiled["stage"] is not None and patient["stage"] not in compiled["stage"]:
+        return False, (REASON_STAGE,)
+
+    # Mutation check
+    if compiled["mutations"] is not None and patient["mutation_status"] not in compiled["mutations"]:
+        return False, (REASON_MUTATION,)
+
+    # Performance status check
+    if patient["performance_status"] > compiled["perf_max"]:
+        return False, (REASON_PERF,)
+
+    return True, (REASON_OK,)
+
+def format_reasons(patient, compiled, codes):
+    """Render reason codes into human-readable strings for display."""
+    return [
+        REASON_TEMPLATES[code].format(
+            stage=patient["stage"],
+            stages=sorted(compiled["stage"]) if compiled["stage"] else [],
+            mutation=patient["mutation_status"],
+            mutations=sorted(compiled["mutations"]) if compiled["mutations"] else [],
+            perf=patient["performance_status"],
+            perf_max=compiled["perf_max"],
+        )
+        for code in codes
+    ]
+
+def _category_lut(column, allowed):
+    """Boolean lookup table over a categorical column: lut[code] is True when
+    the category is in `allowed`. The extra trailing slot stays False so
+    code -1 (missing values) never matches."""
+    cats = column.cat.categories
+    lut = np.zeros(len(cats) + 1, dtype=bool)
+    for i, cat in enumerate(cats):
+        lut[i] = cat in allowed
+    return lut
+
+def compute_match_mask(df, compiled):
+    """Vectorized matcher: returns a boolean mask over all patients at once
+    instead of calling match_patient_to_trial per row."""
+    mask = np.ones(len(df), dtype=bool)
+
+    # Categorical columns are matched via their int8 codes through a small
+    # boolean LUT — a tight NumPy gather instead of string comparisons.
+    if compiled["stage"] is not None:
+        lut = _category_lut(df["stage"], compiled["stage"])
+        mask &= lut[df["stage"].cat.codes.values]
+
+    if compiled["mutations"] is not None:
+        lut = _category_lut(df["mutation_status"], compiled["mutations"])
+        mask &= lut[df["mutation_status"].cat.codes.values]
+
+    mask &= (df["performance_status"].values <= compiled["perf_max"])
+
+    return mask
+
+if numba is not None:
+    @numba.njit(cache=True, parallel=True)
+    def _match_kernel(stage_codes, mut_codes, perf, stage_luts, mut_luts, perf_max, out):
+        for t in numba.prange(stage_luts.shape[0]):
+            for p in range(stage_codes.shape[0]):
+                out[p, t] = (
+                    stage_luts[t, stage_codes[p]]
+                    and mut_luts[t, mut_codes[p]]
+                    and perf[p] <= perf_max[t]
+                )
+
+# Below this row count the JIT/dispatch overhead outweighs the kernel win;
+# the NumPy broadcast path stays in charge for the demo-sized cohort.
+_NUMBA_MIN_ROWS = 10_000
+
+@st.cache_data
+def compute_match_matrix():
+    """Match all patients against all trials in one NumPy broadcast.
+
+    Per-trial LUTs are stacked into (n_trials, n_categories) arrays so the
+    whole patients x trials grid is three gathers and two ANDs instead of a
+    Python double loop. Returns a boolean DataFrame indexed by patient_id
+    with one column per trial file."""
+    df = load_data()
+    compiled = compile_trials(load_trials())
+    trial_files = list(compiled)
+
+    stage_codes = df["stage"].cat.codes.values
+    mut_codes = df["mutation_status"].cat.codes.values
+    perf = df["performance_status"].values
+
+    # All-True rows mean "no constraint" for that trial.
+    stage_luts = np.ones((len(trial_files), len(df["stage"].cat.categories) + 1), dtype=bool)
+    mut_luts = np.ones((len(trial_files), len(df["mutation_status"].cat.categories) + 1), dtype=bool)
+    perf_max = np.empty(len(trial_files), dtype=np.int8)
+    for i, tf in enumerate(trial_files):
+        c = compiled[tf]
+        if c["stage"] is not None:
+            stage_luts[i] = _category_lut(df["stage"], c["stage"])
+        if c["mutations"] is not None:
+            mut_luts[i] = _category_lut(df["mutation_status"], c["mutations"])
+        perf_max[i] = c["perf_max"]
+
+    if numba is not None and len(df) >= _NUMBA_MIN_ROWS:
+        matrix = np.empty((len(df), len(trial_files)), dtype=np.bool_)
+        _match_kernel(stage_codes, mut_codes, perf, stage_luts, mut_luts, perf_max, matrix)
+    else:
+        matrix = (stage_luts[:, stage_codes] & mut_luts[:, mut_codes] & (perf[None, :] <= perf_max[:, None])).T
+    return pd.DataFrame(matrix, index=df.index, columns=trial_files)
+
+@functools.lru_cache(maxsize=4096)
+def _profile_reasons(trial_file, stage, mutation, perf):
+    """Reasons depend only on the matched attributes and the trial, so
+    duplicate patient profiles format their strings once."""
+    compiled = compile_trials(load_trials())[trial_file]
+    patient = {"stage": stage, "mutation_status": mutation, "performance_status": perf}
+    _, codes = match_patient_to_trial(patient, compiled)
+    return tuple(format_reasons(patient, compiled, codes))
+
+def explain_match(trial_file, patient):
+    """Reason strings for one (patient row, trial) pair, memoized by the
+    patient's matching profile — the patient view explains only the
+    selected patient instead of building reasons for the whole cohort."""
+    return list(_profile_reasons(
+        trial_file, patient["stage"], patient["mutation_status"], patient["performance_status"]
+    ))
+
+@st.cache_data
+def compute_matches(trial_file):
+    """Match every patient against one trial. Cached on the filename so
+    widget-driven reruns reuse the result instead of re-matching."""
+    df = load_data()
+    mask = compute_match_matrix()[trial_file].values
+    # Per-row reasons are only rebuilt for non-matches, memoized by profile.
+    profiles = zip(df["stage"], df["mutation_status"], df["performance_status"])
+    reasons = [
+        [REASON_TEMPLATES[REASON_OK]] if ok else list(_profile_reasons(trial_file, *profile))
+        for ok, profile in zip(mask, profiles)
+    ]
+    # Indexed by patient_id so the patient view can .loc straight into it.
+    return pd.DataFrame(
+        {
+            "patient_id": df["patient_id"].values,
+            "is_match": mask,
+            "reasons": reasons,
+        },
+        index=df.index,
+    )
+
+@st.cache_data
+def matched_patients_csv(trial_file):
+    """CSV bytes of the patients matching one trial; cached so download
+    buttons don't re-encode on every rerun."""
+    df = load_data()
+    mask = compute_match_matrix()[trial_file].values
+    return df[mask].to_csv(index=False).encode()
@@ -0,0 +1,111 @@
+"""Trial protocol PDF text extraction."""
+
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pdfplumber
+import streamlit as st
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pragma: no cover - optional fast path
+    pdfium = None
+
+# Compiled once at import; case-insensitive search avoids lowercasing a
+# copy of every line on every upload.
+_INCLUSION_RE = re.compile(r"inclusion", re.IGNORECASE)
+_EXCLUSION_RE = re.compile(r"exclusion", re.IGNORECASE)
+# Headings that typically follow the criteria sections in trial protocols.
+_TERMINATOR_RE = re.compile(r"study design|study objectives|statistical|appendix", re.IGNORECASE)
+# Sentence/bullet separators mapped to newlines in one C-level pass;
+# cheaper than a regex alternation split.
+_CRITERIA_TRANS = str.maketrans({".": "\n", "-": "\n"})
+
+def _split_criteria(text):
+    return [s.strip() for s in text.translate(_CRITERIA_TRANS).splitlines() if s.strip()]
+
+# Fork/pickle overhead outweighs the per-page win below this size.
+_PARALLEL_MIN_PAGES = 8
+
+def _extract_page_text(pdf_path, page_number):
+    # Module-level so it pickles into ProcessPoolExecutor workers.
+    with pdfplumber.open(pdf_path, pages=[page_number]) as pdf:
+        return pdf.pages[0].extract_text() or ""
+
+def iter_page_texts(source):
+    """Yield text per page, using PDFium's C++ extractor when available
+    (5-15x faster than pdfplumber's pure-Python layout analysis) and
+    falling back to pdfplumber for documents PDFium cannot open.
+
+    On the pdfplumber path, long path-backed documents are extracted
+    page-parallel across cores; pdfplumber's layout analysis is CPU-bound
+    and independent per page."""
+    if pdfium is not None:
+        try:
+            pdf = pdfium.PdfDocument(source)
+        except Exception:
+            pdf = None  # e.g. scanned/malformed PDFs: use pdfplumber
+        if pdf is not None:
+            try:
+                for page in pdf:
+                    yield page.get_textpage().get_text_range()
+            finally:
+                pdf.close()
+            return
+    if isinstance(source, (str, os.PathLike)):
+        with pdfplumber.open(source) as pdf:
+            page_count = len(pdf.pages)
+        if page_count >= _PARALLEL_MIN_PAGES:
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+                yield from ex.map(partial(_extract_page_text, source), range(1, page_count + 1))
+            return
+    with pdfplumber.open(source) as pdf:
+        for page in pdf.pages:
+            yield page.extract_text() or ""
+
+@st.cache_data(show_spinner=False)
+def extract_pdf_text(pdf_bytes):
+    """Full-document text for an uploaded PDF. Cached on the raw bytes, so
+    reruns while the uploader still holds the same file skip re-parsing.
+    Pages are streamed into one growing buffer rather than collected into
+    a list of page strings and joined."""
+    buf = io.StringIO()
+    for page_text in iter_page_texts(io.BytesIO(pdf_bytes)):
+        buf.write(page_text)
+        buf.write("\n")
+    return buf.getvalue()
+
+def extract_criteria_from_pdf(pdf_path):
+    """Collect inclusion/exclusion criteria lines with a small section
+    state machine. Pages are extracted lazily and the loop stops as soon
+    as a post-criteria heading is seen, so appendix-heavy protocols never
+    pay for full-document extraction."""
+    inclusion = []
+    exclusion = []
+    state = None  # None -> "inclusion" -> "exclusion" -> "done"
+    for text in iter_page_texts(pdf_path):
+        if not text:
+            continue
+        for line in text.split("\n"):
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if _INCLUSION_RE.search(line):
+                state = "inclusion"
+                inclusion.append(stripped)
+            elif _EXCLUSION_RE.search(line):
+                state = "exclusion"
+                exclusion.append(stripped)
+            elif state == "exclusion" and _TERMINATOR_RE.search(line):
+                state = "done"
+                break
+            elif state == "inclusion":
+                inclusion.extend(_split_criteria(stripped))
+            elif state == "exclusion":
+                exclusion.extend(_split_criteria(stripped))
+        if state == "done":
+            break
+    return inclusion, exclusion
@@ -0,0 +1,54 @@
+"""Disk-backed persistence for reviewer comments and the audit log."""
+
+import streamlit as st
+
+try:
+    from diskcache import Cache
+except ImportError:  # pragma: no cover - optional persistence
+    Cache = None
+
+# LRU-evicted beyond this, so the store stays bounded no matter how long
+# the deployment runs.
+_SIZE_LIMIT = 100_000_000  # bytes
+
+@st.cache_resource
+def get_store():
+    """One disk cache per process, shared across sessions. Returns None
+    when diskcache is not installed; state then lives only in
+    session_state, as before."""
+    if Cache is None:
+        return None
+    return Cache(".trialmatch_cache", size_limit=_SIZE_LIMIT)
+
+def save_comment(key, comment, status):
+    """Write-through for one (patient_id, trial_title) comment row."""
+    store = get_store()
+    if store is not None:
+        store.set(("comment",) + key, {"comment": comment, "status": status})
+
+def load_comments():
+    """All persisted comment rows as {(patient_id, trial_title): row}."""
+    store = get_store()
+    if store is None:
+        return {}
+    rows = {}
+    for cache_key in store:
+        if isinstance(cache_key, tuple) and cache_key[0] == "comment":
+            row = store.get(cache_key)
+            if row is not None:
+                rows[cache_key[1:]] = row
+    return rows
+
+def append_log(entry):
+    """Persist one audit-log entry, keyed by its timestamp."""
+    store = get_store()
+    if store is not None:
+        store.set(("log", entry["ts_ns"]), entry)
+
+def load_log():
+    """Persisted audit-log entries, oldest first."""
+    store = get_store()
+    if store is None:
+        return []
+    keys = sorted(k for k in store if isinstance(k, tuple) and k[0] == "log")
+    return [e for e in (store.get(k) for k in keys) if e is not None]